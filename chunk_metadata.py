@@ -0,0 +1,98 @@
+import os
+import re
+import json
+import numpy as np
+
+DISCOURSE_BASE_URL = "https://discourse.onlinedegree.iitm.ac.in"
+TDS_BASE_URL = "https://tds.s-anand.net"
+
+link_pattern = re.compile(
+    r'\[(Source|View Original Thread)\]\((https?://[^\)]+)\)',
+    re.IGNORECASE
+)
+thread_id_pattern = re.compile(r"/t/(?:[^/]+/)?(\d+)/?$")
+# Discourse posts are rendered as "**username**  \n*2025-01-31T16:13:36.640Z*"
+timestamp_pattern = re.compile(r"\*(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(?:\.\d+)?Z)\*")
+
+# Per-chunk fields stored next to the embeddings in content_embeddings.npz
+METADATA_FIELDS = ("urls", "source_types", "thread_ids", "timestamps", "previews", "aliases")
+# Fields that archives built by older versions of create_embeddings.py may lack
+OPTIONAL_METADATA_FIELDS = ("aliases",)
+
+
+def load_topic_slugs(path: str = "topic_ids_and_slugs.json") -> dict:
+    if not os.path.exists(path):
+        print(f"⚠️  {path} not found, Discourse URLs will not include slugs")
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def canonical_url(url: str, topic_slug_map: dict) -> str:
+    """Add the topic slug to Discourse URLs that only carry the id (e.g. /t/176077)."""
+    if re.match(rf"{re.escape(DISCOURSE_BASE_URL)}/t/\d+$", url):
+        topic_id = url.rstrip("/").split("/")[-1]
+        slug = topic_slug_map.get(topic_id)
+        if slug:
+            return f"{DISCOURSE_BASE_URL}/t/{slug}/{topic_id}"
+    return url
+
+
+def text_preview(chunk: str, max_words: int = 20) -> str:
+    # Remove the link itself from the chunk to extract a clean text preview
+    preview = re.sub(link_pattern, "", chunk)
+    preview = re.sub(r"[#*_>`]", "", preview)  # Remove markdown characters
+    preview = " ".join(preview.strip().split()[:max_words])
+    return preview + "..." if preview else "Referenced content"
+
+
+def chunk_metadata(chunk: str, topic_slug_map: dict) -> dict:
+    """Derive the link and source details for one chunk."""
+    match = link_pattern.search(chunk)
+    url = canonical_url(match.group(2), topic_slug_map) if match else ""
+
+    if url.startswith(DISCOURSE_BASE_URL):
+        source_type = "discourse"
+    elif url.startswith(TDS_BASE_URL):
+        source_type = "tds"
+    else:
+        source_type = ""
+
+    thread_match = thread_id_pattern.search(url) if source_type == "discourse" else None
+    timestamp_match = timestamp_pattern.search(chunk)
+    return {
+        "urls": url,
+        "source_types": source_type,
+        "thread_ids": thread_match.group(1) if thread_match else "",
+        "timestamps": timestamp_match.group(1) if timestamp_match else "",
+        "previews": text_preview(chunk) if url else "",
+        "aliases": "",
+    }
+
+
+def alias_urls(duplicates, url: str, topic_slug_map: dict) -> list[str]:
+    """Source URLs of a chunk's near-duplicates, other than its own."""
+    aliases = []
+    for duplicate in duplicates:
+        match = link_pattern.search(duplicate)
+        alias = canonical_url(match.group(2), topic_slug_map) if match else ""
+        if alias and alias != url and alias not in aliases:
+            aliases.append(alias)
+    return aliases
+
+
+def build_metadata(chunks, topic_slug_map: dict, duplicates=None) -> dict:
+    """Build one array per metadata field, aligned with the chunk array.
+
+    ``duplicates`` optionally lists, per chunk, the near-duplicate chunks that
+    were dropped in its favour; their source URLs are kept as newline-separated
+    ``aliases``.
+    """
+    rows = [chunk_metadata(str(chunk), topic_slug_map) for chunk in chunks]
+    for row, dropped in zip(rows, duplicates or []):
+        row["aliases"] = "\n".join(alias_urls(dropped, row["urls"], topic_slug_map))
+    for previous, row in zip(rows, rows[1:]):
+        # A long post can fill a whole chunk; it was posted when the chunk before it was
+        if not row["timestamps"] and row["thread_ids"] and row["thread_ids"] == previous["thread_ids"]:
+            row["timestamps"] = previous["timestamps"]
+    return {field: np.array([row[field] for row in rows], dtype=str) for field in METADATA_FIELDS}
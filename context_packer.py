@@ -0,0 +1,105 @@
+import re
+import numpy as np
+
+# Rough size of a token for English/markdown text; good enough for budgeting
+CHARS_PER_TOKEN = 4
+
+STOPWORDS = {
+    "the", "and", "for", "are", "but", "not", "you", "all", "can", "has", "have", "was",
+    "what", "when", "where", "which", "who", "how", "why", "this", "that", "with", "from",
+    "should", "would", "could", "does", "did", "will", "about", "into", "there", "their",
+    "them", "then", "than", "use", "using", "just", "also", "any", "our", "your",
+}
+
+link_line_pattern = re.compile(r"\[(Source|View Original Thread)\]\(https?://[^\)]+\)", re.IGNORECASE)
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def query_terms(query: str) -> set[str]:
+    words = re.findall(r"[a-z0-9_]+", query.lower())
+    return {word for word in words if len(word) > 2 and word not in STOPWORDS}
+
+
+def mmr_select(query_vector, candidate_vectors, lambda_mult: float = 0.7, redundancy_threshold: float = 0.92) -> list[int]:
+    """Order candidates by maximal marginal relevance, dropping near-duplicates of already picked ones."""
+    candidates = np.asarray(candidate_vectors, dtype=np.float32)
+    query = np.asarray(query_vector, dtype=np.float32)
+    candidates = candidates / np.maximum(np.linalg.norm(candidates, axis=1, keepdims=True), 1e-12)
+    query = query / max(np.linalg.norm(query), 1e-12)
+
+    relevance = candidates @ query
+    pairwise = candidates @ candidates.T
+    selected = []
+    remaining = list(range(len(candidates)))
+    while remaining:
+        if selected:
+            redundancy = pairwise[np.ix_(remaining, selected)].max(axis=1)
+            # Near-duplicates of something already picked add nothing to the prompt
+            distinct = redundancy < redundancy_threshold
+            remaining = [i for i, keep in zip(remaining, distinct) if keep]
+            redundancy = redundancy[distinct]
+            if not remaining:
+                break
+        else:
+            redundancy = np.zeros(len(remaining))
+        scores = lambda_mult * relevance[remaining] - (1 - lambda_mult) * redundancy
+        selected.append(remaining.pop(int(np.argmax(scores))))
+    return selected
+
+
+def trim_chunk(chunk: str, query: str, max_tokens: int) -> str:
+    """Keep the paragraphs of a chunk that overlap most with the query, in their original order."""
+    if estimate_tokens(chunk) <= max_tokens:
+        return chunk
+
+    terms = query_terms(query)
+    paragraphs = [p for p in re.split(r"\n\s*\n", chunk) if p.strip()]
+    scored = []
+    for position, paragraph in enumerate(paragraphs):
+        if link_line_pattern.search(paragraph):
+            # Source links are always kept so the model can cite them
+            score = float("inf")
+        else:
+            words = set(re.findall(r"[a-z0-9_]+", paragraph.lower()))
+            score = len(terms & words)
+        scored.append((score, position))
+
+    kept = {}
+    used = 0
+    for score, position in sorted(scored, key=lambda item: (-item[0], item[1])):
+        paragraph = paragraphs[position]
+        cost = estimate_tokens(paragraph) + 1
+        if cost > max_tokens:
+            # A paragraph bigger than the whole budget (e.g. a long unbroken post)
+            # is cut to whatever room is left rather than dropped
+            room = (max_tokens - used - 1) * CHARS_PER_TOKEN
+            if room > 0:
+                kept[position] = paragraph[:room]
+            break
+        if used + cost > max_tokens:
+            continue
+        kept[position] = paragraph
+        used += cost
+    return "\n\n".join(kept[i] for i in sorted(kept))
+
+
+def pack_context(query: str, query_vector, chunks: list[str], chunk_vectors, token_budget: int, max_chunk_tokens: int) -> tuple[str, int]:
+    """Build the prompt context from retrieved chunks within a token budget.
+
+    Returns the packed context and its estimated token count.
+    """
+    packed = []
+    used = 0
+    for i in mmr_select(query_vector, chunk_vectors):
+        remaining = token_budget - used
+        if remaining < 64:
+            break
+        trimmed = trim_chunk(chunks[i], query, min(max_chunk_tokens, remaining))
+        if not trimmed:
+            continue
+        packed.append(trimmed)
+        used += estimate_tokens(trimmed) + 1
+    return "\n".join(packed), used
@@ -5,8 +5,12 @@ from semantic_text_splitter import MarkdownSplitter
 import time
 import os
 from rate_limiter import RateLimiter
+from chunk_metadata import build_metadata, load_topic_slugs
+from dedup import near_duplicate_groups
+from vector_index import reduce_embeddings
 import httpx
 import re
+import argparse
 
 rate_limiter = RateLimiter(requests_per_minute=5, requests_per_second=2)
 url = "https://aipipe.org/openai/v1/embeddings"
@@ -82,6 +86,18 @@ def get_embedding(text: str, max_retries: int = 3) -> list[float]:
     raise Exception("Max retries exceeded")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chunk the Markdowns and embed them into content_embeddings.npz")
+    parser.add_argument(
+        "--reduced-dims", type=int, default=0,
+        help="Also store a copy of every vector cut to this many dimensions (e.g. 256) for a faster first-pass search",
+    )
+    parser.add_argument(
+        "--dedup-threshold", type=float, default=0.8,
+        help="Word-shingle Jaccard similarity above which chunks count as near-duplicates and are embedded once",
+    )
+    parser.add_argument("--no-dedup", action="store_true", help="Embed every chunk, even near-duplicates")
+    args = parser.parse_args()
+
     # files stores all markdown files in the "Markdowns" directory
     files = [*Path("Markdowns").glob("*.md"), *Path("Markdowns").rglob("*.md")]
     
@@ -97,25 +113,53 @@ if __name__ == "__main__":
         file_chunks[file_path] = chunks
         total_chunks += len(chunks)
 
-    with tqdm(total=total_chunks, desc="Creating embeddings") as pbar:
-        for file_path, chunks in file_chunks.items():
-            for chunk in chunks:
-                if not chunk.strip():
-                    pbar.update(1)
-                    continue
-                try:
-                    embedding =get_embedding(chunk)
-                    all_chunks.append(chunk)
-                    all_embeddings.append(embedding)
-                    pbar.update(1)
-                except Exception as e:
-                    print(f"Skipping chunk from {file_path.name} due to error: {e}")
-                    pbar.update(1)
-                    continue
+    candidates = [
+        (file_path, chunk)
+        for file_path, chunks in file_chunks.items()
+        for chunk in chunks
+        if chunk.strip()
+    ]
+
+    # Cross-posted announcements and quoted replies repeat the same text across
+    # threads: embed one copy per group and keep the others' URLs as aliases
+    if args.no_dedup:
+        groups = [[i] for i in range(len(candidates))]
+    else:
+        groups = near_duplicate_groups([chunk for _, chunk in candidates], args.dedup_threshold)
+        print(f"🧹 Near-duplicates dropped: {len(candidates) - len(groups)} of {len(candidates)} chunks")
+
+    all_duplicates = []
+    with tqdm(total=len(groups), desc="Creating embeddings") as pbar:
+        for group in groups:
+            file_path, chunk = candidates[group[0]]
+            try:
+                embedding =get_embedding(chunk)
+                all_chunks.append(chunk)
+                all_embeddings.append(embedding)
+                all_duplicates.append([candidates[i][1] for i in group[1:]])
+                pbar.update(1)
+            except Exception as e:
+                print(f"Skipping chunk from {file_path.name} due to error: {e}")
+                pbar.update(1)
+                continue
     
-    # Save all the embeddings and chunks to a numpy archive file
-    np.savez("content_embeddings.npz", chunks=np.array(all_chunks), embeddings=np.array(all_embeddings))
+    # Precompute link, source and preview details so the API does no regex work per query
+    metadata = build_metadata(all_chunks, load_topic_slugs(), all_duplicates)
+
+    extra_arrays = {}
+    if args.reduced_dims:
+        extra_arrays["embeddings_reduced"] = reduce_embeddings(all_embeddings, args.reduced_dims)
+
+    # Save all the embeddings, chunks and their metadata to a numpy archive file
+    np.savez(
+        "content_embeddings.npz",
+        chunks=np.array(all_chunks),
+        embeddings=np.array(all_embeddings),
+        **metadata,
+        **extra_arrays,
+    )
     print("✅ Saved embeddings to embeddings.npz")
     print(f"\n✅ Finished embedding generation.")
     print(f"📄 Files processed: {len(files)}")
+    print(f"📄 Chunks found: {total_chunks}")
     print(f"📦 Chunks embedded: {len(all_chunks)}")
\ No newline at end of file
@@ -0,0 +1,78 @@
+import re
+import zlib
+import numpy as np
+
+# Smallest prime above 2^32, so every 32-bit shingle hash is below it
+PRIME = np.uint64(4294967311)
+
+
+def normalize_for_shingles(text: str) -> list[str]:
+    # URLs, post timestamps and markdown differ between otherwise identical copies
+    text = re.sub(r"\(https?://[^\)]+\)", " ", text)
+    text = re.sub(r"\d{4}-\d{2}-\d{2}T[\d:.]+Z", " ", text)
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+def shingles(text: str, size: int = 5) -> set[int]:
+    """Hashes of the word ``size``-grams of a text."""
+    words = normalize_for_shingles(text)
+    if len(words) < size:
+        return {zlib.crc32(" ".join(words).encode())} if words else set()
+    return {zlib.crc32(" ".join(words[i:i + size]).encode()) for i in range(len(words) - size + 1)}
+
+
+def minhash_signatures(shingle_sets: list[set[int]], num_perm: int = 128, seed: int = 1) -> np.ndarray:
+    """One MinHash signature (``num_perm`` values) per shingle set."""
+    rng = np.random.default_rng(seed)
+    # Keep a * x below 2^63 so the uint64 arithmetic never overflows
+    a = rng.integers(1, 2**31, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, 2**31, size=num_perm, dtype=np.uint64)
+    signatures = np.full((len(shingle_sets), num_perm), np.iinfo(np.uint64).max, dtype=np.uint64)
+    for i, hashes in enumerate(shingle_sets):
+        if hashes:
+            values = np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+            signatures[i] = ((np.outer(values, a) + b) % PRIME).min(axis=0)
+    return signatures
+
+
+def near_duplicate_groups(texts: list[str], threshold: float = 0.8, num_perm: int = 128, bands: int = 16) -> list[list[int]]:
+    """Group texts whose word-shingle Jaccard similarity is at least ``threshold``.
+
+    Candidate pairs come from locality-sensitive hashing of MinHash signatures
+    (``bands`` bands of ``num_perm // bands`` rows) and are confirmed with the
+    exact Jaccard similarity. Every text is in exactly one group, and groups and
+    their members are in input order. The first member is the representative,
+    and every other member is within ``threshold`` of it, not merely of some
+    other member, so dropping them loses no distinct content.
+    """
+    shingle_sets = [shingles(text) for text in texts]
+    signatures = minhash_signatures(shingle_sets, num_perm)
+    rows = num_perm // bands
+
+    # The LSH buckets each text fell into, to look up its candidate duplicates
+    buckets_of = [[] for _ in texts]
+    for band in range(bands):
+        buckets = {}
+        for i, hashes in enumerate(shingle_sets):
+            if hashes:
+                key = signatures[i, band * rows:(band + 1) * rows].tobytes()
+                bucket = buckets.setdefault(key, [])
+                bucket.append(i)
+                buckets_of[i].append(bucket)
+
+    group_of = [None] * len(texts)
+    groups = []
+    for i in range(len(texts)):
+        if group_of[i] is not None:
+            continue
+        group_of[i] = len(groups)
+        group = [i]
+        a = shingle_sets[i]
+        candidates = {j for bucket in buckets_of[i] for j in bucket if j > i and group_of[j] is None}
+        for j in sorted(candidates):
+            b = shingle_sets[j]
+            if len(a & b) / len(a | b) >= threshold:
+                group_of[j] = group_of[i]
+                group.append(j)
+        groups.append(group)
+    return groups
@@ -0,0 +1,93 @@
+import threading
+import time
+from metrics import metrics
+from upstream import UpstreamTimeout
+
+
+class _PendingText:
+    def __init__(self, text: str, timeout: float | None):
+        self.text = text
+        self.expires_at = time.monotonic() + timeout if timeout is not None else None
+        self.vector = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent get_embedding() calls into batched embedding requests.
+
+    The first caller to arrive becomes the leader and sends the batch. While
+    another batch is already in flight the leader lingers for up to
+    ``max_wait`` seconds (or until ``max_batch`` texts are queued) so that
+    concurrent callers share one upstream request. With nothing in flight the
+    batch is sent immediately, so a lone request pays no extra latency.
+    """
+
+    def __init__(self, embed_batch, max_wait: float = 0.005, max_batch: int = 32):
+        self.embed_batch = embed_batch
+        self.max_wait = max_wait
+        self.max_batch = max_batch
+        self.lock = threading.Lock()
+        self.batch_full = threading.Event()
+        self.pending = []
+        self.leader_active = False
+        self.in_flight = 0
+
+    def embed(self, text: str, timeout: float | None = None) -> list[float]:
+        item = _PendingText(text, timeout)
+        with self.lock:
+            self.pending.append(item)
+            if len(self.pending) >= self.max_batch:
+                self.batch_full.set()
+            lead = not self.leader_active
+            self.leader_active = True
+
+        if lead:
+            self._flush()
+        if not item.done.wait(timeout):
+            raise UpstreamTimeout(f"No embedding within {timeout:.1f}s")
+        if item.error is not None:
+            raise item.error
+        return item.vector
+
+    def _flush(self):
+        with self.lock:
+            busy = self.in_flight > 0
+        if busy:
+            self.batch_full.wait(self.max_wait)
+
+        with self.lock:
+            batch = self.pending[:self.max_batch]
+            self.pending = self.pending[self.max_batch:]
+            self.batch_full.clear()
+            if len(self.pending) >= self.max_batch:
+                self.batch_full.set()
+            self.in_flight += 1
+            if self.pending:
+                # Hand the leftovers to a new leader so this caller isn't held up
+                threading.Thread(target=self._flush, daemon=True).start()
+            else:
+                self.leader_active = False
+
+        metrics.inc("tds_embedding_batches_total")
+        metrics.inc("tds_embedding_batch_items_total", amount=len(batch))
+        # The batch may take as long as its most patient caller allows
+        deadlines = [item.expires_at for item in batch]
+        timeout = None if None in deadlines else max(deadlines) - time.monotonic()
+        try:
+            if timeout is None:
+                vectors = self.embed_batch([item.text for item in batch])
+            else:
+                vectors = self.embed_batch([item.text for item in batch], max(timeout, 0.001))
+            if len(vectors) != len(batch):
+                raise ValueError(f"Embedding API returned {len(vectors)} vectors for {len(batch)} inputs")
+            for item, vector in zip(batch, vectors):
+                item.vector = vector
+        except Exception as e:
+            for item in batch:
+                item.error = e
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+            for item in batch:
+                item.done.set()
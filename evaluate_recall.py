@@ -0,0 +1,57 @@
+import argparse
+import re
+import time
+import numpy as np
+from vector_index import VectorIndex, reduce_embeddings
+
+
+def load_eval_questions(path: str) -> list[str]:
+    # eval.yaml keeps each question on one "question: ..." line
+    with open(path, "r", encoding="utf-8") as f:
+        return re.findall(r"^\s*question:\s*(.+?)\s*$", f.read(), re.MULTILINE)
+
+
+def time_per_query(search, queries) -> float:
+    start = time.perf_counter()
+    for query in queries:
+        search(query)
+    return (time.perf_counter() - start) / len(queries)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the recall of reduced-dimension search against the exact full-dimension search")
+    parser.add_argument("--archive", default="content_embeddings.npz")
+    parser.add_argument("--dims", type=int, nargs="+", default=[256], help="Reduced dimensions to evaluate")
+    parser.add_argument("--rescore", type=int, default=100, help="Candidates rescored with full vectors")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--questions", default="eval.yaml", help="Embed the questions in this promptfoo file as queries")
+    parser.add_argument("--sample", type=int, default=0, help="Instead, use this many random chunk embeddings as queries")
+    args = parser.parse_args()
+
+    index = VectorIndex.from_archive(args.archive)
+    if args.sample:
+        rng = np.random.default_rng(0)
+        queries = index.embeddings[rng.choice(len(index), size=min(args.sample, len(index)), replace=False)]
+    else:
+        from create_embeddings import get_embedding
+        questions = load_eval_questions(args.questions)
+        print(f"Embedding {len(questions)} questions from {args.questions}")
+        queries = np.array([get_embedding(question) for question in questions], dtype=np.float32)
+
+    # Exact results: full-dimension brute-force scan
+    full_dims = index.embeddings.shape[1]
+    index.reduced_embeddings = None
+    exact = [set(index.search(query, args.k).tolist()) for query in queries]
+    exact_time = time_per_query(lambda query: index.search(query, args.k), queries)
+    print(f"\nQueries: {len(queries)}, chunks: {len(index)}, k={args.k}, rescore={args.rescore}")
+    print(f"{'dims':>6} {'recall@k':>9} {'scan bytes/query':>17} {'ms/query':>9}")
+    print(f"{full_dims:>6} {1.0:>9.3f} {index.embeddings.nbytes:>17,} {exact_time * 1000:>9.2f}")
+
+    for dims in args.dims:
+        index.reduced_embeddings = reduce_embeddings(index.embeddings, dims)
+        recalls = [
+            len(expected & set(index.search(query, args.k, args.rescore).tolist())) / len(expected)
+            for query, expected in zip(queries, exact)
+        ]
+        two_stage_time = time_per_query(lambda query: index.search(query, args.k, args.rescore), queries)
+        print(f"{dims:>6} {np.mean(recalls):>9.3f} {index.reduced_embeddings.nbytes:>17,} {two_stage_time * 1000:>9.2f}")
@@ -18,19 +18,32 @@ from io import BytesIO
 import argparse
 import base64
 import json
-import numpy as np
+import itertools
 import os
 import re
 from pathlib import Path
 from fastapi import FastAPI,Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 import httpx
 from google import genai
-from google.genai.types import GenerateContentConfig
+from google.genai.types import GenerateContentConfig, HttpOptions, Part
+from PIL import Image, ImageOps
 from fastapi.middleware.cors import CORSMiddleware
 import time
 from typing import Optional
 from rate_limiter import RateLimiter
+from metrics import metrics, StageTimer, TOKEN_BUCKETS
+from context_packer import pack_context, estimate_tokens
+from vector_index import VectorIndex
+from index_manager import IndexManager
+from upstream import CircuitBreaker, Deadline, Upstream
+from embedding_batcher import EmbeddingBatcher
+from single_flight import SingleFlight
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from starlette.concurrency import run_in_threadpool
 
 app = FastAPI()
 
@@ -44,22 +57,88 @@ app.add_middleware(
 )
 
 rate_limiter = RateLimiter(requests_per_minute=5, requests_per_second=2)
-url  = "https://aipipe.org/openai/v1/embeddings"
+url  = os.getenv("EMBEDDING_API_URL", "https://aipipe.org/openai/v1/embeddings")
 headers = {
     "Content-Type": "application/json",
     "Authorization": f"Bearer {os.getenv('OPENAI_API_KEY')}"
 }
+# Point at stub_upstream.py to test behaviour under slow or failing upstreams
+gemini_base_url = os.getenv("GEMINI_BASE_URL")
+
+# Total time an /api request may spend; each stage gets a share of what is left
+request_budget = float(os.getenv("REQUEST_BUDGET_SECONDS", "30"))
+
+embeddings_upstream = Upstream("embeddings", rate_limiter=rate_limiter)
+gemini_breaker = CircuitBreaker("gemini")
+gemini_image_upstream = Upstream("gemini_image", gemini_breaker)
+gemini_generation_upstream = Upstream("gemini_generation", gemini_breaker)
+
+# Creating a client is slow, so one is shared and the timeout is set per request
+gemini = None
+gemini_lock = threading.Lock()
+
+def gemini_client() -> genai.Client:
+    global gemini
+    # Only ever create one: a discarded client closes its connections when collected
+    with gemini_lock:
+        if gemini is None:
+            gemini = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"), http_options=HttpOptions(base_url=gemini_base_url))
+    return gemini
+
+def gemini_http_options(timeout: float) -> HttpOptions:
+    return HttpOptions(timeout=int(timeout * 1000))
 
 
-import mimetypes
 from fastapi import UploadFile
-def get_image_description(image_input: str | UploadFile):
-    client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
 
+# Images larger than this are rejected before they are decoded
+max_image_bytes = int(os.getenv("MAX_IMAGE_BYTES", str(8 * 1024 * 1024)))
+# A small compressed file can still decode to gigabytes, so the pixel count is capped too
+max_image_pixels = int(os.getenv("MAX_IMAGE_PIXELS", str(50_000_000)))
+# Longest side sent to Gemini; it tiles images at 768px, so more adds little
+image_max_side = int(os.getenv("IMAGE_MAX_SIDE", "1024"))
+
+def check_image_size(size: int):
+    if size > max_image_bytes:
+        raise ValueError(f"Image is too large ({size // 1024} KB, limit {max_image_bytes // 1024} KB)")
+
+def normalize_image(image_data: bytes) -> bytes:
+    """Decode the image once, downscale it to image_max_side and recompress it as JPEG"""
+    try:
+        image = Image.open(BytesIO(image_data))
+    except Exception:
+        raise ValueError("Unrecognized image format or decoding failed")
+    # open() only reads the header, so this rejects decompression bombs before decoding
+    if image.width * image.height > max_image_pixels:
+        raise ValueError(f"Image is too large ({image.width}x{image.height}, limit {max_image_pixels} pixels)")
+    try:
+        # Lets JPEGs decode straight at a reduced scale
+        image.draft("RGB", (image_max_side, image_max_side))
+        image.load()
+    except Exception:
+        raise ValueError("Unrecognized image format or decoding failed")
+
+    # Re-encoding drops EXIF, so apply its orientation to the pixels (phone photos)
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ("RGBA", "LA", "P"):
+        # Flatten transparency onto white, as screenshots are usually displayed
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+    elif image.mode != "RGB":
+        image = image.convert("RGB")
+
+    image.thumbnail((image_max_side, image_max_side), Image.LANCZOS)
+    output = BytesIO()
+    image.save(output, format="JPEG", quality=85, optimize=True)
+    return output.getvalue()
+
+def get_image_description(image_input: str | UploadFile, timeout: float = request_budget):
     if isinstance(image_input, UploadFile):
         # Case 1: FastAPI file upload
-        mime_type = image_input.content_type
-        image_data = image_input.file.read()
+        image_data = image_input.file.read(max_image_bytes + 1)
+        check_image_size(len(image_data))
 
     elif isinstance(image_input, str):
         if image_input.startswith("file://"):
@@ -67,166 +146,185 @@ def get_image_description(image_input: str | UploadFile):
             file_path = image_input.replace("file://", "")
             if not os.path.exists(file_path):
                 raise FileNotFoundError(f"File not found: {file_path}")
-            mime_type, _ = mimetypes.guess_type(file_path)
-            if mime_type is None:
-                mime_type = "image/png"
+            check_image_size(os.path.getsize(file_path))
             with open(file_path, "rb") as f:
                 image_data = f.read()
 
-        elif image_input.startswith("data:image"):
-            # Case 3: data:image/png;base64,...
-            match = re.match(r"data:(image/\w+);base64,(.+)", image_input)
-            if not match:
-                raise ValueError("Invalid data URL format")
-            mime_type, base64_data = match.groups()
-            image_data = base64.b64decode(base64_data)
-
         else:
-            try:
+            if image_input.startswith("data:image"):
+                # Case 3: data:image/png;base64,...
+                header, _, base64_data = image_input.partition(",")
+                if not re.match(r"data:image/[\w.+-]+;base64$", header):
+                    raise ValueError("Invalid data URL format")
+            else:
                 # Case 4: plain base64 string (no header)
-                image_data = base64.b64decode(image_input)
-                mime_type = "image/png"  # Fallback default
+                base64_data = image_input
+            # Check the decoded size before decoding anything
+            check_image_size(len(base64_data) * 3 // 4)
+            try:
+                image_data = base64.b64decode(base64_data)
             except Exception:
                 raise ValueError("Unrecognized image format or decoding failed")
 
     else:
         raise ValueError("Unsupported image input format")
 
-    # Upload image to Gemini and generate caption
-    image = BytesIO(image_data)
-    uploaded_file = client.files.upload(file=image, config={"mime_type": mime_type})
-
-    response = client.models.generate_content(
-        model="gemini-2.0-flash-lite",
-        contents=[
-            uploaded_file,
-            "Describe the image in detail, including objects, actions, and context."
-        ]
-    )
-    return response.text or ""
+    jpeg_data = normalize_image(image_data)
+    metrics.inc("tds_image_bytes_total", {"stage": "received"}, len(image_data))
+    metrics.inc("tds_image_bytes_total", {"stage": "sent"}, len(jpeg_data))
+
+    def describe(call_timeout: float) -> str:
+        # Send the image inline with the prompt: one request, no separate upload
+        response = gemini_client().models.generate_content(
+            model="gemini-2.0-flash-lite",
+            contents=[
+                Part.from_bytes(data=jpeg_data, mime_type="image/jpeg"),
+                "Describe the image in detail, including objects, actions, and context."
+            ],
+            config=GenerateContentConfig(http_options=gemini_http_options(call_timeout)),
+        )
+        return response.text or ""
+
+    return gemini_image_upstream.call(describe, timeout)
+
+# The index is loaded once per process and reused across requests.
+# With INDEX_SHARED_DIR set (e.g. /dev/shm/tds-index) the first worker publishes
+# it there and every uvicorn worker memory-maps the same copy.
+index_manager = IndexManager("content_embeddings.npz", os.getenv("INDEX_SHARED_DIR"))
+
+# Pick up a rebuilt content_embeddings.npz without restarting (0 disables the watcher)
+index_watch_interval = float(os.getenv("INDEX_WATCH_INTERVAL", "0"))
+if index_watch_interval > 0:
+    index_manager.watch(index_watch_interval)
+
+def load_embeddings() -> VectorIndex:
+    return index_manager.get()
+
+# Candidates rescored with full vectors when the index has reduced embeddings
+search_rescore = int(os.getenv("SEARCH_RESCORE_CANDIDATES", "100"))
+
+SEARCH_FILTERS = ("source", "term", "since", "until")
+
+def parse_filters(filters: Optional[dict]) -> dict:
+    """Validate the optional /api search filters"""
+    if not filters:
+        return {}
+    if not isinstance(filters, dict):
+        raise ValueError("filters must be an object")
+    unknown = set(filters) - set(SEARCH_FILTERS)
+    if unknown:
+        raise ValueError(f"Unknown filters: {', '.join(sorted(unknown))}")
+    return {key: value for key, value in filters.items() if value is not None}
+
+def get_embeddings(texts: list[str], timeout: float = request_budget) -> list[list[float]]:
+    """Get embeddings for a batch of texts in one request with rate limiting, retries and hedging"""
+
+    def post(call_timeout: float) -> list[list[float]]:
+        json_data = {
+            "input": texts,
+            "model": "text-embedding-3-small"
+        }
+        response = httpx.post(url=url,headers=headers,json=json_data,timeout=call_timeout)
+        response.raise_for_status()  # Raise an error for bad responses
+
+        json_response = response.json()
+
+        if "data" in json_response and isinstance(json_response["data"], list):
+            # Results carry their input position; don't rely on response order
+            ordered = sorted(json_response["data"], key=lambda item: item.get("index", 0))
+            return [item["embedding"] for item in ordered]
+        else:
+            raise ValueError("Unexpected response format from embedding API")
 
-def load_embeddings():
-    data = np.load("content_embeddings.npz", allow_pickle=True)
-    return data["chunks"], data["embeddings"]
+    return embeddings_upstream.call(post, timeout)
 
-def get_embedding(text: str, max_retries: int = 3) -> list[float]:
-    """Get embedding for text chunk with rate limiting and retry logic"""
-    
-    for attempt in range(max_retries):
-        try:
-            # Apply rate limiting
-            rate_limiter.wait_if_needed()
-            
-            json_data = {
-                "input": text,
-                "model": "text-embedding-3-small"
-            }
-            response = httpx.post(url=url,headers=headers,json=json_data)
-            response.raise_for_status()  # Raise an error for bad responses
+# Prompt context is packed to this many (estimated) tokens
+context_token_budget = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+chunk_token_budget = int(os.getenv("CHUNK_TOKEN_BUDGET", "1500"))
 
-            json_response = response.json()
+# Concurrent query embeddings are coalesced into batched upstream requests
+embedding_batcher = EmbeddingBatcher(
+    get_embeddings,
+    max_wait=float(os.getenv("EMBED_BATCH_WINDOW_MS", "5")) / 1000,
+    max_batch=int(os.getenv("EMBED_BATCH_MAX", "32")),
+)
 
-            if "data" in json_response and isinstance(json_response["data"], list):
-                return json_response["data"][0]["embedding"]
-            else:
-                raise ValueError("Unexpected response format from embedding API")
-            
-        except Exception as e:
-            if "rate limit" in str(e).lower() or "quota" in str(e).lower():
-                # Exponential backoff for rate limit errors
-                wait_time = 2 ** attempt
-                print(f"Rate limit hit, waiting {wait_time} seconds...")
-                time.sleep(wait_time)
-            elif attempt == max_retries - 1:
-                print(f"Failed to get embedding after {max_retries} attempts: {e}")
-                raise
-            else:
-                print(f"Attempt {attempt + 1} failed: {e}, retrying...")
-                time.sleep(1)
-    
-    raise Exception("Max retries exceeded")
+def get_embedding(text: str, timeout: float = request_budget) -> list[float]:
+    """Get embedding for a single query, sharing an upstream request with concurrent callers"""
+    return embedding_batcher.embed(text, timeout)
     
-def generate_llm_response(question: str, context: str) -> str:
-    client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
-
-    # Load system prompt from file
-    with open("system_prompt.txt", "r") as f:
-        system_prompt = f.read()
-
-    response = client.models.generate_content(
-        model="gemini-2.0-flash-lite",
-        contents=[
-            system_prompt,
-            f"Context: {context}",
-            f"Question: {question}",
-        ],
-        config=GenerateContentConfig(
-            max_output_tokens=512,
-            top_p=0.95,
-            top_k=40,
+# Load system prompt from file
+with open("system_prompt.txt", "r") as f:
+    system_prompt = f.read()
+
+def generate_llm_response(question: str, context: str, timeout: float = request_budget) -> str:
+    def generate(call_timeout: float) -> str:
+        response = gemini_client().models.generate_content(
+            model="gemini-2.0-flash-lite",
+            contents=[
+                system_prompt,
+                f"Context: {context}",
+                f"Question: {question}",
+            ],
+            config=GenerateContentConfig(
+                max_output_tokens=512,
+                top_p=0.95,
+                top_k=40,
+                http_options=gemini_http_options(call_timeout),
+            )
         )
-    )
-
-    return response.text or ""
+        return response.text or ""
 
-with open("topic_ids_and_slugs.json", "r") as f:
-    topic_slug_map = json.load(f)
+    return gemini_generation_upstream.call(generate, timeout)
 
-def extract_links_with_text(chunks: list[str]) -> list[dict]:
-    """Extract [Source](url) links and provide context snippets."""
-    link_pattern = re.compile(
-        r'\[(Source|View Original Thread)\]\((https?://[^\)]+)\)',
-        re.IGNORECASE
-    )
+def build_links(metadata: dict, indices) -> list[dict]:
+    """Look up the precomputed source URL and preview for each retrieved chunk."""
     links = []
     seen_urls = set()
 
-    for chunk in chunks:
-        match = link_pattern.search(chunk)
-        if match:
-            url = match.group(2)
-            # Fix the URL if it's missing the slug (e.g., ends with /t/176077)
-            corrected_url = url
-            if re.match(r"https://discourse\.onlinedegree\.iitm\.ac\.in/t/\d+$", url):
-                topic_id = url.rstrip("/").split("/")[-1]
-                slug = topic_slug_map.get(topic_id)
-                if slug:
-                    corrected_url = f"https://discourse.onlinedegree.iitm.ac.in/t/{slug}/{topic_id}"
-
-            if corrected_url in seen_urls:
-                continue
-            seen_urls.add(corrected_url)
-            # Remove the link itself from the chunk to extract a clean text preview
-            text_preview = re.sub(link_pattern, "", chunk)
-            text_preview = re.sub(r"[#*_>`]", "", text_preview)  # Remove markdown characters
-            text_preview = " ".join(text_preview.strip().split()[:20])
-
-            links.append({
-                "url": corrected_url,
-                "text": text_preview + "..." if text_preview else "Referenced content"
-            })
+    for i in indices:
+        url = str(metadata["urls"][i])
+        if not url or url in seen_urls:
+            continue
+        seen_urls.add(url)
+        links.append({
+            "url": url,
+            "text": str(metadata["previews"][i]),
+        })
+        # Near-duplicates merged at index build time (e.g. a cross-posted announcement)
+        for alias in str(metadata["aliases"][i]).split("\n"):
+            if alias and alias not in seen_urls:
+                seen_urls.add(alias)
+                links.append({"url": alias, "text": str(metadata["previews"][i])})
 
     return links
 
 
-def answer(question: str, image: Optional[str] = None):
-    loaded_chunks, loaded_embeddings = load_embeddings()
+def answer(question: str, image: Optional[str] = None, timer: Optional[StageTimer] = None, filters: Optional[dict] = None):
+    timer = timer or StageTimer()
+    deadline = Deadline(request_budget)
+    filters = parse_filters(filters)
+    with timer.stage("load"):
+        index = load_embeddings()
     if image:
-        image_description = get_image_description(image)
+        with timer.stage("image"):
+            image_description = get_image_description(image, deadline.stage_timeout("image"))
         question += f" {image_description}"
 
-    question_embedding = get_embedding(question)
+    with timer.stage("embedding"):
+        question_embedding = get_embedding(question, deadline.stage_timeout("embedding"))
 
-    # Calculate cosine similarity
-    similarities = np.dot(loaded_embeddings, question_embedding) / (
-        np.linalg.norm(loaded_embeddings, axis=1) * np.linalg.norm(question_embedding)
-    )
+    with timer.stage("search"):
+        # Get the index of the top 10 similar chunks, searching only the partitions matching the filters
+        top_indices = index.search(question_embedding, 10, search_rescore, **filters)
+
+    return generate_answer(index, question, question_embedding, top_indices, deadline, timer)
 
-    # Get the index of the top 10 similar chunks
-    top_indices = np.argsort(similarities)[-10:][::-1]
 
+def generate_answer(index: VectorIndex, question: str, question_embedding, top_indices, deadline: Deadline, timer: StageTimer) -> dict:
+    """Build the links and packed context for the retrieved chunks and generate the answer"""
     # Get the top chunks
-    top_chunks = [loaded_chunks[i] for i in top_indices]
+    top_chunks = [str(index.chunks[i]) for i in top_indices]
 
     # with open("debug_top_chunks.txt", "w", encoding="utf-8") as debug_file:
     #     debug_file.write("Question:\n" + question + "\n\n")
@@ -235,10 +333,21 @@ def answer(question: str, image: Optional[str] = None):
     #         debug_file.write(f"--- Chunk {i} ---\n{chunk.strip()}\n\n")
 
 
-    # Extract links with text from the top chunks
-    links = extract_links_with_text(top_chunks)
+    # Look up links with text for the top chunks
+    with timer.stage("links"):
+        links = build_links(index.metadata, top_indices)
+
+    with timer.stage("packing"):
+        context, context_tokens = pack_context(
+            question, question_embedding, top_chunks, index.embeddings[top_indices],
+            context_token_budget, chunk_token_budget,
+        )
+    prompt_tokens = estimate_tokens(system_prompt) + estimate_tokens(question) + context_tokens
+    print(f"Prompt tokens (estimated): {prompt_tokens}")
+    metrics.observe("tds_prompt_tokens", prompt_tokens, buckets=TOKEN_BUCKETS)
 
-    response = generate_llm_response(question, "\n".join(top_chunks))
+    with timer.stage("generation"):
+        response = generate_llm_response(question, context, deadline.stage_timeout("generation"))
     print(response)
     if response.lower().strip() == "i don't know":
         links = []
@@ -246,18 +355,200 @@ def answer(question: str, image: Optional[str] = None):
     return{
         "answer": response,
         "links": links,
+        "index_version": index.version,
     }
 
 
+# Batches embed every question in one request, then generate up to this many answers at once
+batch_concurrency = int(os.getenv("BATCH_CONCURRENCY", "8"))
+batch_max_items = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+
+def parse_batch_items(items) -> list[tuple[str, Optional[str]]]:
+    """Validate the /api/batch items"""
+    if not isinstance(items, list) or not items:
+        raise ValueError("items must be a non-empty list")
+    if len(items) > batch_max_items:
+        raise ValueError(f"At most {batch_max_items} items are allowed per batch")
+    parsed = []
+    for item in items:
+        if not isinstance(item, dict) or not isinstance(item.get("question", ""), str):
+            raise ValueError("Each item must be an object with a question")
+        parsed.append((item.get("question", ""), item.get("image")))
+    return parsed
+
+def answer_batch(items: list[tuple[str, Optional[str]]], filters: Optional[dict] = None, timer: Optional[StageTimer] = None):
+    """Answer several questions, yielding (position, result) pairs as each one finishes"""
+    timer = timer or StageTimer()
+    filters = parse_filters(filters)
+    with timer.stage("load"):
+        index = load_embeddings()
+
+    questions = [question for question, _ in items]
+    errors = {}
+    with ThreadPoolExecutor(max_workers=batch_concurrency) as executor:
+        with timer.stage("image"):
+            futures = {
+                executor.submit(get_image_description, image, Deadline(request_budget).stage_timeout("image")): i
+                for i, (_, image) in enumerate(items) if image
+            }
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    questions[i] += f" {future.result()}"
+                except Exception as e:
+                    errors[i] = e
+
+        pending = [i for i in range(len(items)) if i not in errors]
+        try:
+            if pending:
+                with timer.stage("embedding"):
+                    # One embeddings request for the whole batch
+                    embeddings = get_embeddings([questions[i] for i in pending], request_budget)
+                with timer.stage("search"):
+                    top_indices = index.search_many(embeddings, 10, search_rescore, **filters)
+        except Exception as e:
+            errors.update({i: e for i in pending})
+            pending = []
+
+        for i, error in errors.items():
+            yield i, {"error": str(error)}
+
+        # Each item is timed on its own, so time spent by the consumer between
+        # yields is not counted as generation
+        item_timers = {i: StageTimer() for i in pending}
+        futures = {
+            executor.submit(
+                generate_answer, index, questions[i], embeddings[j], top_indices[j],
+                Deadline(request_budget), item_timers[i],
+            ): i
+            for j, i in enumerate(pending)
+        }
+        for future in as_completed(futures):
+            i = futures[future]
+            # Items run concurrently, so the batch reports the slowest item's stages
+            for name, seconds in item_timers[i].durations.items():
+                timer.durations[name] = max(timer.durations.get(name, 0.0), seconds)
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"error": str(e)}
+            yield i, result
+
+
+# Identical questions asked at the same time share one run of answer()
+single_flight = SingleFlight()
+
+def question_key(question: str, image: Optional[str] = None, filters: Optional[dict] = None) -> tuple:
+    normalized = " ".join(question.lower().split())
+    image_hash = hashlib.sha256(image.encode()).hexdigest() if image else ""
+    return (normalized, image_hash, json.dumps(filters or {}, sort_keys=True, default=str))
+
+def answer_deduplicated(question: str, image: Optional[str] = None, timer: Optional[StageTimer] = None, filters: Optional[dict] = None):
+    timer = timer or StageTimer()
+    start = time.perf_counter()
+    key = question_key(question, image, filters)
+    result, shared = single_flight.do(key, answer, question, image, timer, filters)
+    if shared:
+        timer.durations["shared"] = time.perf_counter() - start
+        metrics.inc("tds_singleflight_shared_total")
+        # Embedding + generation, plus the caption when an image is attached
+        metrics.inc("tds_upstream_calls_saved_total", amount=3 if image else 2)
+    return result
+
+
 @app.post("/api")
 async def get_answer(request: Request):
+    timer = StageTimer()
+    start = time.perf_counter()
     try:
         data = await request.json()
         print(data)
-        return answer(data.get("question",""),data.get("image"))
+        # Run the blocking pipeline off the event loop so requests overlap
+        result = await run_in_threadpool(
+            answer_deduplicated, data.get("question",""), data.get("image"), timer, data.get("filters")
+        )
+        status = "ok"
     except Exception as e:
         print(f"Error processing request: {e}")
-        return {"error": str(e)}
+        result = {"error": str(e)}
+        status = "error"
+
+    elapsed = time.perf_counter() - start
+    timer.durations["total"] = elapsed
+    metrics.observe("tds_request_duration_seconds", elapsed, {"endpoint": "/api"})
+    metrics.inc("tds_requests_total", {"endpoint": "/api", "status": status})
+    return JSONResponse(content=result, headers={"Server-Timing": timer.server_timing()})
+
+@app.post("/api/batch")
+async def get_batch_answers(request: Request):
+    timer = StageTimer()
+    start = time.perf_counter()
+    stream = False
+    try:
+        data = await request.json()
+        items = parse_batch_items(data.get("items"))
+        filters = parse_filters(data.get("filters"))
+        stream = bool(data.get("stream"))
+        print(f"Batch of {len(items)} questions")
+        results = answer_batch(items, filters, timer)
+        if stream:
+            # Run the batch up to its first result before responding, so the
+            # Server-Timing header covers the shared stages (load, embedding, search)
+            first = await run_in_threadpool(next, results, None)
+        else:
+            def collect():
+                collected = [None] * len(items)
+                for i, result in results:
+                    collected[i] = result
+                return collected
+
+            result = {"results": await run_in_threadpool(collect)}
+        status = "ok"
+    except Exception as e:
+        print(f"Error processing batch request: {e}")
+        result = {"error": str(e)}
+        status = "error"
+        stream = False
+    metrics.inc("tds_requests_total", {"endpoint": "/api/batch", "status": status})
+
+    if stream:
+        server_timing = timer.server_timing()
+
+        # One JSON object per line, in completion order, tagged with the item's position
+        def stream_results():
+            try:
+                if first is None:
+                    return
+                for i, item_result in itertools.chain([first], results):
+                    yield json.dumps({"index": i, **item_result}) + "\n"
+            except Exception as e:
+                # Headers are already sent; report the failure in the stream itself
+                print(f"Error streaming batch: {e}")
+                yield json.dumps({"error": str(e)}) + "\n"
+            finally:
+                metrics.observe("tds_request_duration_seconds", time.perf_counter() - start, {"endpoint": "/api/batch"})
+        return StreamingResponse(stream_results(), media_type="application/x-ndjson", headers={"Server-Timing": server_timing})
+
+    elapsed = time.perf_counter() - start
+    timer.durations["total"] = elapsed
+    metrics.observe("tds_request_duration_seconds", elapsed, {"endpoint": "/api/batch"})
+    return JSONResponse(content=result, headers={"Server-Timing": timer.server_timing()})
+
+@app.post("/admin/reload")
+async def reload_index(request: Request, force: bool = False):
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if not admin_token or request.headers.get("Authorization") != f"Bearer {admin_token}":
+        return JSONResponse(status_code=403, content={"error": "Forbidden"})
+    started = index_manager.reload_in_background(force)
+    current = index_manager.current.version if index_manager.current else None
+    return JSONResponse(
+        status_code=202,
+        content={"status": "reloading" if started else "reload already running", "index_version": current},
+    )
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 from fastapi.responses import HTMLResponse
 
@@ -329,8 +620,15 @@ async def api_usage():
         <ul>
             <li><code>question</code> (required): Your query as a string.</li>
             <li><code>image</code> (optional): Base64-encoded image (data URL).</li>
+            <li><code>filters</code> (optional): Restrict the search with <code>source</code> (<code>discourse</code> or <code>tds</code>), <code>term</code> (e.g. <code>jan-2025</code>), <code>since</code> and <code>until</code> (ISO dates).</li>
         </ul>
 
+        <p>
+            To answer many questions at once, <code>POST</code> to <code>/api/batch</code> with
+            <code>{"items": [{"question": "..."}, ...]}</code>. Results come back in order, or as
+            newline-delimited JSON as each one finishes with <code>"stream": true</code>.
+        </p>
+
         <h2>📌 Example</h2>
         <pre>{
     "question": "Explain histogram equalization"
@@ -0,0 +1,100 @@
+import os
+import threading
+import time
+from metrics import metrics
+from vector_index import VectorIndex, archive_version
+
+
+class IndexManager:
+    """Holds the active VectorIndex and swaps in new versions without a restart.
+
+    Requests take a reference to ``get()`` once and keep using it, so a swap
+    only affects requests that start afterwards. The old index is released
+    once the last request holding it finishes.
+    """
+
+    def __init__(self, path: str = "content_embeddings.npz", shared_dir: str | None = None):
+        self.path = path
+        self.shared_dir = shared_dir
+        self.current = None
+        self.load_lock = threading.Lock()
+        self.reload_thread = None
+        self.next_shared_check = 0.0
+
+    def _load(self) -> VectorIndex:
+        if self.shared_dir:
+            return VectorIndex.from_shared(self.path, self.shared_dir)
+        return VectorIndex.from_archive(self.path)
+
+    def _activate(self, index: VectorIndex):
+        # A single reference assignment, so readers see either the old or the new index
+        self.current = index
+        metrics.reset_gauge("tds_index_info")
+        metrics.set_gauge("tds_index_info", 1, {"version": index.version})
+        metrics.set_gauge("tds_index_chunks", len(index))
+
+    def get(self) -> VectorIndex:
+        index = self.current
+        metrics.record_cache("index", index is not None)
+        if index is None:
+            with self.load_lock:
+                if self.current is None:
+                    self._activate(self._load())
+            index = self.current
+        elif self.shared_dir:
+            self._follow_shared(index)
+        return index
+
+    def _follow_shared(self, index: VectorIndex, interval: float = 1.0):
+        # Publishing a new version removes the old one from shared_dir, so a
+        # worker whose version is gone reloads; this way a reload received by
+        # one worker reaches all of them. Checked at most once per ``interval``.
+        now = time.monotonic()
+        if now < self.next_shared_check:
+            return
+        self.next_shared_check = now + interval
+        if not os.path.isdir(os.path.join(self.shared_dir, index.version)):
+            self.reload_in_background()
+
+    def reload(self, force: bool = False) -> bool:
+        """Load the archive if its version changed and swap it in. Returns True if swapped."""
+        with self.load_lock:
+            version = archive_version(self.path)
+            if not force and self.current is not None and self.current.version == version:
+                return False
+            try:
+                index = self._load()
+                if archive_version(self.path) != version:
+                    raise RuntimeError("archive changed while it was being loaded")
+            except Exception as e:
+                # Keep serving the old index; the next check will try again
+                print(f"Index reload failed, keeping {self.current.version if self.current else 'no index'}: {e}")
+                metrics.inc("tds_index_reloads_total", {"outcome": "error"})
+                return False
+            old_version = self.current.version if self.current else None
+            self._activate(index)
+        print(f"Index reloaded: {old_version} -> {index.version}")
+        metrics.inc("tds_index_reloads_total", {"outcome": "success"})
+        return True
+
+    def reload_in_background(self, force: bool = False) -> bool:
+        """Start a reload unless one is already running. Returns True if one was started."""
+        if self.reload_thread is not None and self.reload_thread.is_alive():
+            return False
+        self.reload_thread = threading.Thread(target=self.reload, args=(force,), daemon=True)
+        self.reload_thread.start()
+        return True
+
+    def watch(self, interval: float):
+        """Poll the archive every ``interval`` seconds and reload it when it changes."""
+        def poll():
+            while True:
+                time.sleep(interval)
+                try:
+                    if self.current is not None and archive_version(self.path) != self.current.version:
+                        self.reload()
+                except FileNotFoundError:
+                    # The archive is being replaced; look again on the next tick
+                    pass
+
+        threading.Thread(target=poll, daemon=True).start()
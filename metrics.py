@@ -0,0 +1,158 @@
+import time
+import threading
+from contextlib import contextmanager
+
+# Latency buckets (seconds) shared by all histograms
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+HELP = {
+    "tds_requests_total": ("counter", "API requests handled, by endpoint and status."),
+    "tds_request_duration_seconds": ("histogram", "End-to-end API request latency."),
+    "tds_stage_duration_seconds": ("histogram", "Latency of each stage of answer()."),
+    "tds_prompt_tokens": ("histogram", "Estimated prompt tokens sent for generation."),
+    "tds_upstream_requests_total": ("counter", "Calls made to upstream APIs, by upstream and outcome."),
+    "tds_upstream_retries_total": ("counter", "Retries issued to upstream APIs."),
+    "tds_upstream_hedges_total": ("counter", "Hedged duplicate requests sent after the observed p95 latency."),
+    "tds_upstream_hedge_wins_total": ("counter", "Hedged requests that finished before the original."),
+    "tds_upstream_throttled_total": ("counter", "Calls given up because our own rate limit had no slot in time."),
+    "tds_circuit_state": ("gauge", "Circuit breaker state per upstream (0 closed, 1 open, 2 half-open)."),
+    "tds_circuit_rejections_total": ("counter", "Calls rejected because the circuit was open."),
+    "tds_image_bytes_total": ("counter", "Image bytes received from clients and sent to Gemini."),
+    "tds_embedding_batches_total": ("counter", "Batched embedding requests sent upstream."),
+    "tds_embedding_batch_items_total": ("counter", "Texts embedded through batched requests."),
+    "tds_singleflight_shared_total": ("counter", "Requests answered by joining an identical in-flight request."),
+    "tds_upstream_calls_saved_total": ("counter", "Upstream calls avoided by single-flight deduplication."),
+    "tds_index_info": ("gauge", "Version of the active embedding index."),
+    "tds_index_chunks": ("gauge", "Chunks in the active embedding index."),
+    "tds_index_reloads_total": ("counter", "Index reloads, by outcome."),
+    "tds_cache_requests_total": ("counter", "Cache lookups, by cache and result."),
+    "tds_cache_hit_ratio": ("gauge", "Fraction of cache lookups that were hits."),
+}
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += value
+        self.count += 1
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    parts = [f'{key}="{str(value)}"' for key, value in labels]
+    return "{" + ",".join(parts) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metrics:
+    """Thread-safe counters and histograms rendered in Prometheus text format."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    def inc(self, name: str, labels: dict | None = None, amount: float = 1):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set_gauge(self, name: str, value: float, labels: dict | None = None):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self.lock:
+            self.gauges[key] = value
+
+    def reset_gauge(self, name: str):
+        with self.lock:
+            self.gauges = {key: value for key, value in self.gauges.items() if key[0] != name}
+
+    def observe(self, name: str, value: float, labels: dict | None = None, buckets=DEFAULT_BUCKETS):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(buckets)
+            self.histograms[key].observe(value)
+
+    def record_cache(self, cache: str, hit: bool):
+        self.inc("tds_cache_requests_total", {"cache": cache, "result": "hit" if hit else "miss"})
+
+    def _cache_ratios(self) -> dict:
+        # Derive hit ratios from the hit/miss counters
+        totals = {}
+        for (name, labels), value in self.counters.items():
+            if name != "tds_cache_requests_total":
+                continue
+            label_dict = dict(labels)
+            hits, lookups = totals.get(label_dict["cache"], (0, 0))
+            if label_dict["result"] == "hit":
+                hits += value
+            totals[label_dict["cache"]] = (hits, lookups + value)
+        return {(("cache", cache),): hits / lookups for cache, (hits, lookups) in totals.items() if lookups}
+
+    def render(self) -> str:
+        with self.lock:
+            series = {}
+            for (name, labels), value in [*self.counters.items(), *self.gauges.items()]:
+                series.setdefault(name, []).append((labels, value))
+            for labels, ratio in self._cache_ratios().items():
+                series.setdefault("tds_cache_hit_ratio", []).append((labels, ratio))
+            histograms = {}
+            for (name, labels), histogram in self.histograms.items():
+                histograms.setdefault(name, []).append((labels, histogram))
+
+            lines = []
+            for name in sorted(set(series) | set(histograms)):
+                kind, help_text = HELP.get(name, ("untyped", name))
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in sorted(series.get(name, [])):
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                for labels, histogram in sorted(histograms.get(name, []), key=lambda item: item[0]):
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        bucket_labels = labels + (("le", _format_value(bound)),)
+                        lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {count}")
+                    inf_labels = labels + (("le", "+Inf"),)
+                    lines.append(f"{name}_bucket{_format_labels(inf_labels)} {histogram.count}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(histogram.total)}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+            return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+class StageTimer:
+    """Times the stages of a single request and reports them as a Server-Timing header."""
+
+    def __init__(self, registry: Metrics = metrics):
+        self.registry = registry
+        self.durations = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.durations[name] = self.durations.get(name, 0.0) + elapsed
+            self.registry.observe("tds_stage_duration_seconds", elapsed, {"stage": name})
+
+    def server_timing(self) -> str:
+        return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.durations.items())
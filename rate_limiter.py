@@ -1,4 +1,5 @@
 import time
+import threading
 
 class RateLimiter:
     def __init__(self, requests_per_minute=60, requests_per_second=2):
@@ -6,27 +7,31 @@ class RateLimiter:
         self.requests_per_second = requests_per_second
         self.request_times = []
         self.last_request_time = 0
+        self.lock = threading.Lock()
     
     def wait_if_needed(self):
-        current_time = time.time()
-        
-        # Per-second rate limiting
-        time_since_last = current_time - self.last_request_time
-        if time_since_last < (1.0 / self.requests_per_second):
-            sleep_time = (1.0 / self.requests_per_second) - time_since_last
-            time.sleep(sleep_time)
-        
-        # Per-minute rate limiting
-        current_time = time.time()
-        self.request_times = [t for t in self.request_times if current_time - t < 60]
-        
-        if len(self.request_times) >= self.requests_per_minute:
-            sleep_time = 60 - (current_time - self.request_times[0])
-            if sleep_time > 0:
-                time.sleep(sleep_time)
-                # Clean up old requests after sleeping
-                current_time = time.time()
-                self.request_times = [t for t in self.request_times if current_time - t < 60]
-        
-        self.request_times.append(current_time)
-        self.last_request_time = current_time
\ No newline at end of file
+        self.acquire()
+
+    def acquire(self, timeout: float | None = None) -> bool:
+        """Reserve the next free request slot and sleep until it comes.
+
+        If that slot is more than ``timeout`` seconds away nothing is reserved
+        and False is returned. The lock is only held while picking the slot, so
+        a caller that gives up never holds up the others.
+        """
+        with self.lock:
+            current_time = time.time()
+            self.request_times = [t for t in self.request_times if current_time - t < 60]
+
+            # Per-second rate limiting
+            slot = max(current_time, self.last_request_time + 1.0 / self.requests_per_second)
+            # Per-minute rate limiting: at most requests_per_minute slots in any 60 s
+            if len(self.request_times) >= self.requests_per_minute:
+                slot = max(slot, self.request_times[-self.requests_per_minute] + 60)
+
+            if timeout is not None and slot - current_time > timeout:
+                return False
+            self.request_times.append(slot)
+            self.last_request_time = slot
+        time.sleep(max(0.0, slot - current_time))
+        return True
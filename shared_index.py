@@ -0,0 +1,90 @@
+import os
+import shutil
+import numpy as np
+
+# Strings longer than this are packed as UTF-8 bytes + offsets instead of fixed-width unicode
+PACK_STRINGS_LONGER_THAN = 256
+
+
+class PackedStrings:
+    """Read-only string array backed by memory-mapped UTF-8 bytes and offsets."""
+
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, (int, np.integer)):
+            if i < 0:
+                i += len(self)
+            return bytes(self.data[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+        return np.array([self[int(j)] for j in np.arange(len(self))[i]], dtype=str)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+def publish(arrays: dict, directory: str):
+    """Write arrays as .npy files that any process can memory-map.
+
+    Files are written to a temporary directory that is renamed into place, so
+    readers never see a partially published index.
+    """
+    tmp_dir = f"{directory}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    for name, array in arrays.items():
+        array = np.asarray(array)
+        if array.dtype.kind == "U" and array.dtype.itemsize // 4 > PACK_STRINGS_LONGER_THAN:
+            encoded = [str(value).encode("utf-8") for value in array]
+            offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum([len(value) for value in encoded])
+            np.save(os.path.join(tmp_dir, f"{name}.data.npy"), np.frombuffer(b"".join(encoded), dtype=np.uint8))
+            np.save(os.path.join(tmp_dir, f"{name}.offsets.npy"), offsets)
+        else:
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), array)
+    os.rename(tmp_dir, directory)
+
+
+def attach(directory: str) -> dict:
+    """Memory-map every array in a published directory (zero-copy, read-only)."""
+    arrays = {}
+    for filename in sorted(os.listdir(directory)):
+        path = os.path.join(directory, filename)
+        if filename.endswith(".data.npy"):
+            name = filename.removesuffix(".data.npy")
+            offsets = np.load(os.path.join(directory, f"{name}.offsets.npy"), mmap_mode="r")
+            arrays[name] = PackedStrings(np.load(path, mmap_mode="r"), offsets)
+        elif not filename.endswith(".offsets.npy"):
+            arrays[filename.removesuffix(".npy")] = np.load(path, mmap_mode="r")
+    return arrays
+
+
+def load_shared(shared_dir: str, version: str, load) -> dict:
+    """Attach to the published arrays for ``version``, publishing them first if needed.
+
+    ``load`` builds the arrays and is only called by the first process to take
+    the lock; every other worker just maps the files it wrote.
+    """
+    import fcntl
+
+    os.makedirs(shared_dir, exist_ok=True)
+    directory = os.path.join(shared_dir, version)
+    with open(os.path.join(shared_dir, ".lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            if not os.path.isdir(directory):
+                print(f"Publishing index {version} to {directory}")
+                publish(load(), directory)
+                # Workers still mapping an older version keep it until they drop it
+                for name in os.listdir(shared_dir):
+                    if name not in (version, ".lock"):
+                        shutil.rmtree(os.path.join(shared_dir, name), ignore_errors=True)
+            # Map the files before unlocking: a worker publishing a newer version
+            # removes this directory, but files already mapped stay readable
+            return attach(directory)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
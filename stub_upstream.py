@@ -0,0 +1,101 @@
+# Local stand-in for the embedding and Gemini APIs that injects slowness and errors,
+# for exercising the timeouts, hedging and circuit breaking in index.py:
+#
+#   python stub_upstream.py --port 9000 --slow-fraction 0.1 --slow-delay 5
+#   EMBEDDING_API_URL=http://localhost:9000/v1/embeddings GEMINI_BASE_URL=http://localhost:9000 uvicorn index:app
+#
+# Behaviour can be changed while it runs, e.g. to simulate an outage:
+#   curl -X POST localhost:9000/stub/config -d '{"error_fraction": 1}'
+
+import argparse
+import asyncio
+import hashlib
+import random
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+app = FastAPI()
+
+config = {
+    "delay": 0.05,  # Seconds every request takes
+    "slow_fraction": 0.0,  # Share of requests that stall
+    "slow_delay": 5.0,  # How long a stalled request takes
+    "error_fraction": 0.0,  # Share of requests that fail
+    "error_status": 503,  # Status code of failed requests
+    "dimensions": 1536,
+}
+stats = {"requests": 0, "slow": 0, "errors": 0}
+
+
+async def misbehave() -> JSONResponse | None:
+    stats["requests"] += 1
+    if random.random() < config["error_fraction"]:
+        stats["errors"] += 1
+        return JSONResponse(status_code=config["error_status"], content={"error": {"message": "Injected failure"}})
+    delay = config["delay"]
+    if random.random() < config["slow_fraction"]:
+        stats["slow"] += 1
+        delay = config["slow_delay"]
+    await asyncio.sleep(delay)
+    return None
+
+
+def fake_embedding(text: str) -> list[float]:
+    seed = int(hashlib.md5(text.encode()).hexdigest()[:8], 16)
+    return np.random.default_rng(seed).normal(size=config["dimensions"]).tolist()
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    failure = await misbehave()
+    if failure:
+        return failure
+    data = await request.json()
+    texts = data["input"] if isinstance(data["input"], list) else [data["input"]]
+    return {
+        "object": "list",
+        "model": data.get("model"),
+        "data": [{"object": "embedding", "index": i, "embedding": fake_embedding(text)} for i, text in enumerate(texts)],
+    }
+
+
+@app.post("/{api_version}/models/{model_action}")
+async def generate_content(api_version: str, model_action: str):
+    # Gemini routes look like /v1beta/models/gemini-2.0-flash-lite:generateContent
+    failure = await misbehave()
+    if failure:
+        return failure
+    model = model_action.split(":")[0]
+    return {
+        "candidates": [{
+            "content": {"role": "model", "parts": [{"text": f"Stub answer from {model}."}]},
+            "finishReason": "STOP",
+        }],
+    }
+
+
+@app.post("/stub/config")
+async def update_config(request: Request):
+    config.update(await request.json())
+    return {"config": config, "stats": stats}
+
+
+@app.get("/stub/stats")
+async def get_stats():
+    return {"config": config, "stats": stats}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Stub embedding and Gemini APIs with injected latency and errors")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--delay", type=float, default=config["delay"])
+    parser.add_argument("--slow-fraction", type=float, default=config["slow_fraction"])
+    parser.add_argument("--slow-delay", type=float, default=config["slow_delay"])
+    parser.add_argument("--error-fraction", type=float, default=config["error_fraction"])
+    parser.add_argument("--error-status", type=int, default=config["error_status"])
+    args = parser.parse_args()
+    config.update({key: value for key, value in vars(args).items() if key in config})
+    uvicorn.run(app, host="127.0.0.1", port=args.port)
@@ -0,0 +1,223 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import httpx
+from google.genai import errors as genai_errors
+from metrics import metrics
+
+# Share of the *remaining* request budget each stage may use. Later stages get
+# whatever earlier ones left over; generation is last and may use all of it.
+STAGE_SHARES = {
+    "image": 0.4,
+    "embedding": 0.25,
+    "generation": 1.0,
+}
+
+CIRCUIT_STATES = {"closed": 0, "open": 1, "half_open": 2}
+
+
+class UpstreamTimeout(TimeoutError):
+    pass
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class Deadline:
+    """Overall time budget for one request, split into per-stage timeouts."""
+
+    def __init__(self, budget: float):
+        self.expires_at = time.monotonic() + budget
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def stage_timeout(self, stage: str) -> float:
+        timeout = self.remaining() * STAGE_SHARES.get(stage, 1.0)
+        if timeout <= 0:
+            raise UpstreamTimeout(f"Request budget exhausted before {stage}")
+        return timeout
+
+
+def status_code(error: Exception) -> int | None:
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code
+    if isinstance(error, genai_errors.APIError):
+        return error.code
+    return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """Timeouts, connection failures, rate limits and server errors are worth retrying."""
+    if isinstance(error, (httpx.TimeoutException, httpx.TransportError, UpstreamTimeout)):
+        return True
+    code = status_code(error)
+    return code is not None and (code == 429 or code >= 500)
+
+
+class CircuitBreaker:
+    """Fails fast after ``failure_threshold`` consecutive failures.
+
+    After ``reset_timeout`` seconds one trial call is let through (half-open);
+    its success closes the circuit again, its failure re-opens it.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self._set_state("closed")
+
+    def _set_state(self, state: str):
+        self.state = state
+        metrics.set_gauge("tds_circuit_state", CIRCUIT_STATES[state], {"upstream": self.name})
+
+    def before_call(self):
+        with self.lock:
+            if self.state == "closed":
+                return
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self._set_state("half_open")
+            if self.state == "half_open" and not self.trial_running:
+                self.trial_running = True
+                return
+        metrics.inc("tds_circuit_rejections_total", {"upstream": self.name})
+        raise CircuitOpenError(f"{self.name} upstream is unavailable (circuit open)")
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.trial_running = False
+            if self.state != "closed":
+                self._set_state("closed")
+
+    def release(self):
+        """Give back a half-open trial that was never sent."""
+        with self.lock:
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                if self.state != "open":
+                    print(f"Circuit for {self.name} opened after {self.failures} failures")
+                self._set_state("open")
+
+
+class Upstream:
+    """Calls one upstream API with a timeout, retries, hedging and a circuit breaker.
+
+    ``call(fn, timeout)`` runs ``fn(timeout)``, which must itself give up after
+    ``timeout`` seconds. Once enough calls have been observed, a call still
+    running after the recent p95 latency gets a hedged duplicate, and
+    whichever finishes first wins.
+
+    With a ``rate_limiter`` every attempt first waits for a request slot, within
+    the caller's timeout. That wait is ours, not the upstream's: it is neither
+    timed nor counted against the circuit breaker, and a hedge is only sent if a
+    slot is free right away.
+    """
+
+    executor = ThreadPoolExecutor(max_workers=64, thread_name_prefix="upstream")
+
+    def __init__(self, name: str, breaker: CircuitBreaker | None = None, max_retries: int = 3,
+                 hedge: bool = True, min_samples: int = 20, rate_limiter=None):
+        self.name = name
+        # Calls to the same service with different latency profiles can share a breaker
+        self.breaker = breaker or CircuitBreaker(name)
+        self.max_retries = max_retries
+        self.hedge = hedge
+        self.min_samples = min_samples
+        self.rate_limiter = rate_limiter
+        self.latencies = deque(maxlen=500)
+        self.lock = threading.Lock()
+
+    def hedge_delay(self) -> float | None:
+        with self.lock:
+            latencies = sorted(self.latencies)
+        if not self.hedge or len(latencies) < self.min_samples:
+            return None
+        return latencies[int(len(latencies) * 0.95) - 1]
+
+    def _timed(self, fn, timeout: float):
+        start = time.monotonic()
+        result = fn(timeout)
+        with self.lock:
+            self.latencies.append(time.monotonic() - start)
+        return result
+
+    def _hedged(self, fn, timeout: float):
+        # Always run on the pool: httpx timeouts bound each read, not the whole call
+        expires_at = time.monotonic() + timeout
+        primary = self.executor.submit(self._timed, fn, timeout)
+        done, pending = set(), {primary}
+        hedge_after = self.hedge_delay()
+        if hedge_after is not None and hedge_after < timeout:
+            done, pending = wait(pending, timeout=hedge_after)
+            if not done and (self.rate_limiter is None or self.rate_limiter.acquire(0)):
+                metrics.inc("tds_upstream_hedges_total", {"upstream": self.name})
+                pending.add(self.executor.submit(self._timed, fn, max(expires_at - time.monotonic(), 0.001)))
+
+        error = None
+        while done or pending:
+            for future in done:
+                if future.exception() is None:
+                    if future is not primary:
+                        metrics.inc("tds_upstream_hedge_wins_total", {"upstream": self.name})
+                    return future.result()
+                error = future.exception()
+            if not pending:
+                break
+            # Losing attempts are left to finish on their own; fn bounds them by its timeout
+            done, pending = wait(pending, timeout=max(expires_at - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+            if not done:
+                raise UpstreamTimeout(f"{self.name} did not respond within {timeout:.1f}s")
+        raise error
+
+    def call(self, fn, timeout: float):
+        expires_at = time.monotonic() + timeout
+        for attempt in range(self.max_retries):
+            self.breaker.before_call()
+            remaining = expires_at - time.monotonic()
+            if remaining <= 0:
+                self.breaker.release()
+                raise UpstreamTimeout(f"{self.name} ran out of time after {attempt} attempts")
+            if self.rate_limiter is not None:
+                if not self.rate_limiter.acquire(remaining):
+                    self.breaker.release()
+                    metrics.inc("tds_upstream_throttled_total", {"upstream": self.name})
+                    raise UpstreamTimeout(f"{self.name} rate limit has no free slot within {remaining:.1f}s")
+                remaining = expires_at - time.monotonic()
+            try:
+                result = self._hedged(fn, remaining)
+            except Exception as e:
+                retryable = is_retryable(e)
+                metrics.inc("tds_upstream_requests_total", {"upstream": self.name, "outcome": "error"})
+                if retryable:
+                    self.breaker.record_failure()
+                else:
+                    # Client errors (bad input, auth) say nothing about upstream health
+                    self.breaker.record_success()
+                if not retryable or attempt == self.max_retries - 1 or time.monotonic() >= expires_at:
+                    print(f"{self.name} failed after {attempt + 1} attempts: {e}")
+                    raise
+                # Exponential backoff for rate limit errors, a short pause otherwise
+                wait_time = 2 ** attempt if status_code(e) == 429 else 0.5
+                wait_time = min(wait_time, max(expires_at - time.monotonic(), 0))
+                print(f"{self.name} attempt {attempt + 1} failed: {e}, retrying in {wait_time:.1f}s...")
+                metrics.inc("tds_upstream_retries_total", {"upstream": self.name})
+                time.sleep(wait_time)
+                continue
+            self.breaker.record_success()
+            metrics.inc("tds_upstream_requests_total", {"upstream": self.name, "outcome": "success"})
+            return result
+        raise UpstreamTimeout(f"{self.name} ran out of retries")
@@ -0,0 +1,202 @@
+import os
+import numpy as np
+from chunk_metadata import METADATA_FIELDS, OPTIONAL_METADATA_FIELDS, build_metadata, load_topic_slugs
+from shared_index import load_shared
+
+
+def term_of(timestamp: str) -> str:
+    """Map a post timestamp to its IITM term: January, May or September of that year."""
+    if not timestamp:
+        return ""
+    year, month = int(timestamp[:4]), int(timestamp[5:7])
+    if month <= 4:
+        return f"jan-{year}"
+    if month <= 8:
+        return f"may-{year}"
+    return f"sep-{year}"
+
+
+def to_epoch_seconds(values) -> np.ndarray:
+    """Parse ISO dates/timestamps into epoch seconds, with NaN for missing values."""
+    # numpy only parses naive timestamps, and ours are all UTC
+    stripped = [str(value).rstrip("Z") if value else "NaT" for value in values]
+    parsed = np.array(stripped, dtype="datetime64[ms]")
+    seconds = parsed.astype("int64").astype(np.float64) / 1000
+    seconds[np.isnat(parsed)] = np.nan
+    return seconds
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def reduce_embeddings(embeddings, dims: int) -> np.ndarray:
+    """Shorten embeddings to their first ``dims`` components and renormalise.
+
+    text-embedding-3 models are trained so that a prefix of the vector is itself
+    a usable embedding; this is what the API's ``dimensions`` parameter returns.
+    """
+    return normalize_rows(np.asarray(embeddings)[..., :dims])
+
+
+def archive_version(path: str) -> str:
+    """Identify an archive by its modification time and size."""
+    stat = os.stat(path)
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+def _as_set(value) -> set | None:
+    if value is None:
+        return None
+    values = [value] if isinstance(value, str) else list(value)
+    # Accept the directory names too (discourse_data / tds_data)
+    return {str(v).lower().removesuffix("_data") for v in values}
+
+
+class VectorIndex:
+    """Chunk embeddings partitioned by source and term, sorted by post date within each partition.
+
+    Rows are reordered by build() so that every (source, term) partition is a
+    contiguous slice, dated rows first in timestamp order. A filtered search
+    then scans only the matching slices, and a date range narrows each slice
+    by binary search, so its cost is proportional to the filtered set.
+    """
+
+    def __init__(self, arrays: dict, version: str = ""):
+        # ``arrays`` are already reordered and normalised, see build()
+        self.arrays = arrays
+        self.version = version
+        self.chunks = arrays["chunks"]
+        self.embeddings = arrays["embeddings"]
+        # Shared copies published by older versions may lack the optional fields
+        empty = np.full(len(self.chunks), "", dtype=str)
+        self.metadata = {field: arrays.get(field, empty) for field in METADATA_FIELDS}
+        self.timestamps = arrays["epoch_seconds"]
+        self.terms = arrays["terms"]
+        self.sources = arrays["sources"]
+        # Optional low-dimensional copy used for the first pass of search()
+        self.reduced_embeddings = arrays.get("embeddings_reduced")
+
+        self.partitions = {}
+        changes = (self.sources[1:] != self.sources[:-1]) | (self.terms[1:] != self.terms[:-1])
+        bounds = [0, *(np.flatnonzero(changes) + 1).tolist(), len(self.sources)]
+        for start, end in zip(bounds, bounds[1:]):
+            if start == end:
+                continue
+            dated_end = start + int(np.count_nonzero(~np.isnan(self.timestamps[start:end])))
+            self.partitions[(str(self.sources[start]), str(self.terms[start]))] = (start, dated_end, end)
+
+    @classmethod
+    def build(cls, chunks, embeddings, metadata: dict, version: str = "", reduced_embeddings=None) -> "VectorIndex":
+        timestamps = to_epoch_seconds(metadata["timestamps"])
+        terms = np.array([term_of(str(t)) for t in metadata["timestamps"]], dtype=str)
+        sources = np.asarray(metadata["source_types"], dtype=str)
+
+        # Group by source, then term, then date; rows without a date sort last
+        order = np.lexsort((timestamps, terms, sources))
+        # Normalise once so a search is a plain dot product
+        arrays = {
+            "chunks": np.asarray(chunks, dtype=str)[order],
+            "embeddings": normalize_rows(np.asarray(embeddings)[order]),
+            "epoch_seconds": timestamps[order],
+            "terms": terms[order],
+            "sources": sources[order],
+        }
+        for field in METADATA_FIELDS:
+            arrays[field] = np.asarray(metadata[field], dtype=str)[order]
+        if reduced_embeddings is not None:
+            arrays["embeddings_reduced"] = normalize_rows(np.asarray(reduced_embeddings)[order])
+        return cls(arrays, version)
+
+    @classmethod
+    def from_archive(cls, path: str = "content_embeddings.npz") -> "VectorIndex":
+        data = np.load(path, allow_pickle=True)
+        if all(field in data for field in METADATA_FIELDS if field not in OPTIONAL_METADATA_FIELDS):
+            empty = np.full(len(data["chunks"]), "", dtype=str)
+            metadata = {field: data[field] if field in data else empty for field in METADATA_FIELDS}
+        else:
+            # Archives built before metadata was stored: derive it once at load
+            print(f"⚠️  {path} has no chunk metadata, rebuild it with create_embeddings.py")
+            metadata = build_metadata(data["chunks"], load_topic_slugs())
+        reduced = data["embeddings_reduced"] if "embeddings_reduced" in data else None
+        return cls.build(data["chunks"], data["embeddings"], metadata, archive_version(path), reduced)
+
+    @classmethod
+    def from_shared(cls, path: str, shared_dir: str) -> "VectorIndex":
+        """Map the index from shared memory, so every worker process uses the same copy."""
+        version = archive_version(path)
+        arrays = load_shared(shared_dir, version, lambda: cls.from_archive(path).arrays)
+        return cls(arrays, version)
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def slices(self, source=None, term=None, since: str | None = None, until: str | None = None) -> list[tuple[int, int]]:
+        """Row ranges matching the filters.
+
+        Date filters skip rows without a timestamp; a term filter keeps them.
+        """
+        sources, terms = _as_set(source), _as_set(term)
+        if sources is None and terms is None and since is None and until is None:
+            return [(0, len(self.chunks))]
+
+        since_seconds, until_seconds = to_epoch_seconds([since, until])
+        if until and len(until) == len("YYYY-MM-DD"):
+            # A bare date includes the whole day
+            until_seconds += 86400 - 0.001
+        ranges = []
+        for (partition_source, partition_term), (start, dated_end, end) in self.partitions.items():
+            if sources is not None and partition_source not in sources:
+                continue
+            # Undated rows (e.g. the TDS notes) belong to no single term, so they match any
+            if terms is not None and partition_term and partition_term not in terms:
+                continue
+            if since is None and until is None:
+                ranges.append((start, end))
+                continue
+            dated = self.timestamps[start:dated_end]
+            lo = start + (int(np.searchsorted(dated, since_seconds, "left")) if since else 0)
+            hi = start + (int(np.searchsorted(dated, until_seconds, "right")) if until else len(dated))
+            if lo < hi:
+                ranges.append((lo, hi))
+        return ranges
+
+    def search(self, query_vector, k: int = 10, rescore: int = 100, **filters) -> np.ndarray:
+        """Return the row indices of the top ``k`` chunks by cosine similarity, best first.
+
+        If the index has reduced embeddings, the filtered rows are first scanned
+        with those and only the best ``rescore`` candidates are scored with the
+        full vectors. Pass ``rescore=0`` to always scan the full vectors.
+        """
+        return self.search_many(np.atleast_2d(query_vector), k, rescore, **filters)[0]
+
+    def search_many(self, query_vectors, k: int = 10, rescore: int = 100, **filters) -> list[np.ndarray]:
+        """search() for several queries at once, scoring them all in one matrix product."""
+        queries = normalize_rows(query_vectors)
+
+        ranges = self.slices(**filters)
+        if not ranges:
+            return [np.array([], dtype=np.int64) for _ in queries]
+        rows = np.concatenate([np.arange(lo, hi) for lo, hi in ranges])
+
+        # Rescoring fewer than k candidates would return fewer than k results
+        shortlist_size = max(rescore, k)
+        if self.reduced_embeddings is not None and rescore > 0 and len(rows) > shortlist_size:
+            reduced_queries = reduce_embeddings(queries, self.reduced_embeddings.shape[1])
+            scores = np.concatenate([self.reduced_embeddings[lo:hi] @ reduced_queries.T for lo, hi in ranges])
+            shortlists = rows[np.argpartition(-scores, shortlist_size - 1, axis=0)[:shortlist_size].T]
+            return [
+                shortlist[_top_k(self.embeddings[shortlist] @ query, k)]
+                for query, shortlist in zip(queries, shortlists)
+            ]
+
+        scores = np.concatenate([self.embeddings[lo:hi] @ queries.T for lo, hi in ranges])
+        return [rows[_top_k(scores[:, j], k)] for j in range(len(queries))]
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]